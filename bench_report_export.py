@@ -0,0 +1,143 @@
+"""
+Streams the school report export over a synthetic school and reports
+throughput and peak Python memory. Peak memory should stay roughly the same
+whether the school has 10k or 100k students.
+
+Run from the project root (the dataset is generated once and reused):
+    python -m services.subjects_service.bench_report_export --students 100000
+    python -m services.subjects_service.bench_report_export --format parquet
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import date, datetime
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from services.database import Base
+from services.auth_service.models import User
+from . import models, reports
+
+SCHOOL_ID = 1
+BATCH = 10000
+
+
+def filler(column, i: int):
+    # Values for required user columns the report does not care about
+    python_type = column.type.python_type
+    if python_type is str:
+        return f"bench_{column.name}_{i}"[: column.type.length or None]
+    if python_type in (int, float):
+        return python_type(0)
+    if python_type is bool:
+        return False
+    if python_type is datetime:
+        return datetime.now()
+    if python_type is date:
+        return date.today()
+    return None
+
+
+def insert_batches(conn, table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH:
+            conn.execute(insert(table), batch)
+            batch = []
+    if batch:
+        conn.execute(insert(table), batch)
+
+
+def populate(engine, students: int, subjects: int, attempts: int):
+    rng = random.Random(42)
+    users = User.__table__
+    required = [
+        c for c in users.columns
+        if not c.nullable and not c.primary_key and c.default is None and c.server_default is None
+        and c.name not in ("fullname", "role", "school_id")
+    ]
+
+    with engine.begin() as conn:
+        insert_batches(conn, users, (
+            {"id": i, "fullname": f"Student {i}", "role": "student", "school_id": SCHOOL_ID,
+             **{c.name: filler(c, i) for c in required}}
+            for i in range(1, students + 1)
+        ))
+        conn.execute(insert(models.Subject), [
+            {"id": s, "name": f"Subject {s}", "code": f"SUB{s}", "school_id": SCHOOL_ID, "enrollment_key": "k"}
+            for s in range(1, subjects + 1)
+        ])
+        conn.execute(insert(models.GeneratedQuiz), [
+            {"id": s, "subject_id": s, "title": f"Quiz {s}", "topic": f"Topic {s}"}
+            for s in range(1, subjects + 1)
+        ])
+        insert_batches(conn, models.SubjectEnrollment.__table__, (
+            {"subject_id": s, "student_id": i}
+            for i in range(1, students + 1) for s in range(1, subjects + 1)
+        ))
+        insert_batches(conn, models.QuizAttempt.__table__, (
+            {"quiz_id": s, "student_id": i, "score": round(rng.uniform(0, 100), 2), "feedback": "", "answers_json": "{}"}
+            for i in range(1, students + 1) for s in range(1, subjects + 1) for _ in range(attempts)
+        ))
+        insert_batches(conn, models.ManualTestResult.__table__, (
+            {"student_id": i, "subject_id": s, "test_title": "Term test", "marks": round(rng.uniform(0, 100), 1)}
+            for i in range(1, students + 1) for s in range(1, subjects + 1)
+        ))
+        insert_batches(conn, models.StudentResult.__table__, (
+            {"student_id": i, "subject_id": s, "marks": rng.randint(0, 100)}
+            for i in range(1, students + 1) for s in range(1, subjects + 1)
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming school report export")
+    parser.add_argument("--students", type=int, default=100000)
+    parser.add_argument("--subjects", type=int, default=3)
+    parser.add_argument("--attempts", type=int, default=2, help="quiz attempts per student per subject")
+    parser.add_argument("--chunk", type=int, default=reports.REPORT_CHUNK_SIZE)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--db", default=None, help="SQLAlchemy URL (default: a SQLite file per dataset size)")
+    args = parser.parse_args()
+
+    url = args.db or f"sqlite:///report_bench_{args.students}_{args.subjects}_{args.attempts}.sqlite3"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(User.__table__)).scalar()
+    if not existing:
+        start = time.perf_counter()
+        populate(engine, args.students, args.subjects, args.attempts)
+        print(f"generated {args.students} students in {time.perf_counter() - start:.1f} s")
+
+    session_factory = sessionmaker(bind=engine)
+    encode = reports.csv_chunks if args.format == "csv" else reports.parquet_chunks
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = 0
+    size = 0
+
+    def counted():
+        nonlocal rows
+        for row in reports.report_rows(session_factory, SCHOOL_ID, args.chunk):
+            rows += 1
+            yield row
+
+    for chunk in encode(counted(), args.chunk):
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{args.format}: {rows} rows, {size / 1e6:.1f} MB in {elapsed:.2f} s "
+        f"({rows / elapsed:,.0f} rows/s), peak Python memory {peak / 1e6:.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
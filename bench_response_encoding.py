@@ -0,0 +1,96 @@
+"""
+Encoding cost per response for large subjects result lists.
+
+Compares what FastAPI does for a route with no response_model
+(jsonable_encoder + json.dumps) against the declared-schema path
+(pydantic-core dump + orjson) used by the subjects router.
+
+Run from the project root:
+    python -m services.subjects_service.bench_response_encoding --rows 5000
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from . import schemas
+
+
+def make_quizzes(rows: int):
+    # Attribute objects stand in for GeneratedQuiz rows loaded by the ORM
+    now = datetime.now()
+    return [
+        SimpleNamespace(
+            id=i,
+            subject_id=i % 40,
+            title=f"Quiz {i}",
+            topic=f"Topic {i % 97}",
+            created_by=i % 15,
+            created_at=now,
+        )
+        for i in range(rows)
+    ]
+
+
+def make_questions(rows: int):
+    return [
+        {
+            "id": i,
+            "text": f"Question number {i}?",
+            "options": [f"Option A{i}", f"Option B{i}", f"Option C{i}", f"Option D{i}"],
+        }
+        for i in range(rows)
+    ]
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    quiz_adapter = TypeAdapter(list[schemas.GeneratedQuizResponse])
+    question_adapter = TypeAdapter(list[schemas.QuizQuestionResponse])
+
+    cases = {
+        "quizzes": (
+            make_quizzes(args.rows),
+            # jsonable_encoder cannot read plain attribute objects, so the
+            # generic path is given their __dict__ like it would an ORM row
+            lambda rows: json.dumps(jsonable_encoder([vars(r) for r in rows])).encode(),
+            lambda rows: orjson.dumps(quiz_adapter.dump_python(quiz_adapter.validate_python(rows), mode="json")),
+        ),
+        "questions": (
+            make_questions(args.rows),
+            lambda rows: json.dumps(jsonable_encoder(rows)).encode(),
+            lambda rows: orjson.dumps(question_adapter.dump_python(question_adapter.validate_python(rows), mode="json")),
+        ),
+    }
+
+    print(f"rows={args.rows} repeat={args.repeat} (best of)")
+    for name, (rows, generic, typed) in cases.items():
+        generic_s = timed(lambda: generic(rows), args.repeat)
+        typed_s = timed(lambda: typed(rows), args.repeat)
+        print(
+            f"{name:<10} jsonable_encoder+json: {generic_s * 1000:8.2f} ms   "
+            f"response_model+orjson: {typed_s * 1000:8.2f} ms   "
+            f"speedup: {generic_s / typed_s:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
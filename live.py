@@ -0,0 +1,259 @@
+import asyncio
+import os
+from dataclasses import dataclass, field
+
+import orjson
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
+from services.database import SessionLocal
+from services.auth_service.models import User
+from services.auth_service.dependencies import get_current_user, global_subscription_guard
+from . import models
+
+# Registered in main.py WITHOUT the router-level subscription guard: the
+# OAuth2 header scheme does not apply to browser sockets, so the socket
+# authenticates itself and runs the guard. The client sends the token as its
+# first message, {"token": "<JWT>"}, rather than in the URL, where access logs
+# would record it.
+router = APIRouter(prefix="/subjects", tags=["Subjects"])
+
+# Messages buffered per socket before it is treated as a slow consumer and dropped
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "64"))
+# Entries sent in the leaderboard snapshot when a socket joins
+LIVE_LEADERBOARD_SIZE = int(os.getenv("LIVE_LEADERBOARD_SIZE", "50"))
+# Seconds a new socket has to send its token
+LIVE_AUTH_TIMEOUT = float(os.getenv("LIVE_AUTH_TIMEOUT", "10"))
+
+# WebSocket close codes
+POLICY_VIOLATION = 1008
+INTERNAL_ERROR = 1011
+TRY_AGAIN_LATER = 1013
+
+
+@dataclass(eq=False)
+class Subscriber:
+    websocket: WebSocket
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=LIVE_QUEUE_SIZE))
+
+
+@dataclass(eq=False)
+class Room:
+    loading: asyncio.Future
+    loaded: bool = False
+    # student_id -> {"student_name", "best_score", "last_score", "attempts"}
+    board: dict = field(default_factory=dict)
+    subscribers: set = field(default_factory=set)
+
+
+class LiveQuizHub:
+    """
+    In-process broadcast hub for live quiz sessions, one room per quiz.
+
+    Rooms only exist while at least one socket is connected; the leaderboard
+    is loaded from the database once when the room opens and then kept up to
+    date from submit_quiz events. Each event is serialised once and fanned out
+    to bounded per-socket queues; a socket whose queue is full is disconnected
+    rather than allowed to hold up the room.
+
+    State is per worker process: a submission only reaches sockets connected
+    to the same uvicorn worker.
+    """
+
+    def __init__(self):
+        self._rooms: dict[int, Room] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # Keeps close tasks for dropped sockets referenced until they finish
+        self._closing: set[asyncio.Task] = set()
+
+    async def join(self, quiz_id: int, websocket: WebSocket) -> Subscriber:
+        self._loop = asyncio.get_running_loop()
+        room = self._rooms.get(quiz_id)
+        if room is None:
+            room = Room(loading=asyncio.ensure_future(run_in_threadpool(load_leaderboard, quiz_id)))
+            self._rooms[quiz_id] = room
+
+        try:
+            rows = await room.loading
+        except Exception:
+            # Forget the failed room so the next socket retries the query
+            if self._rooms.get(quiz_id) is room:
+                del self._rooms[quiz_id]
+            raise
+
+        if not room.loaded:
+            # Scores published while the snapshot query ran are already on the board
+            for student_id, entry in rows.items():
+                current = room.board.get(student_id)
+                if current is None or current["attempts"] < entry["attempts"]:
+                    room.board[student_id] = entry
+            room.loaded = True
+
+        subscriber = Subscriber(websocket)
+        subscriber.queue.put_nowait(self._encode({"type": "leaderboard", "entries": self._top(room)}))
+        room.subscribers.add(subscriber)
+        return subscriber
+
+    def leave(self, quiz_id: int, subscriber: Subscriber):
+        room = self._rooms.get(quiz_id)
+        if room is None:
+            return
+        room.subscribers.discard(subscriber)
+        if not room.subscribers and room.loaded:
+            del self._rooms[quiz_id]
+
+    def publish_score(self, quiz_id: int, student_id: int, student_name: str | None, score: float):
+        """Thread-safe: called from sync routes running in the threadpool."""
+        if self._loop is None or quiz_id not in self._rooms:
+            return
+        self._loop.call_soon_threadsafe(self._apply_score, quiz_id, student_id, student_name, score)
+
+    def _apply_score(self, quiz_id: int, student_id: int, student_name: str | None, score: float):
+        room = self._rooms.get(quiz_id)
+        if room is None:
+            return
+
+        entry = room.board.get(student_id)
+        if entry is None:
+            entry = room.board[student_id] = {
+                "student_name": student_name or "Unknown Student",
+                "best_score": score,
+                "last_score": score,
+                "attempts": 0,
+            }
+        entry["best_score"] = max(entry["best_score"], score)
+        entry["last_score"] = score
+        entry["attempts"] += 1
+
+        rank = 1 + sum(1 for e in room.board.values() if e["best_score"] > entry["best_score"])
+        message = self._encode({"type": "score", "student_id": student_id, "rank": rank, **entry})
+
+        for subscriber in list(room.subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                room.subscribers.discard(subscriber)
+                task = asyncio.ensure_future(self._drop(subscriber))
+                self._closing.add(task)
+                task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _drop(subscriber: Subscriber):
+        try:
+            await subscriber.websocket.close(code=TRY_AGAIN_LATER)
+        except RuntimeError:
+            pass  # Already closed by the client
+
+    @staticmethod
+    async def pump(subscriber: Subscriber):
+        try:
+            while True:
+                message = await subscriber.queue.get()
+                await subscriber.websocket.send_text(message)
+        except (WebSocketDisconnect, RuntimeError):
+            pass  # The receive loop in the endpoint handles cleanup
+
+    @staticmethod
+    def _top(room: Room) -> list:
+        ranked = sorted(room.board.items(), key=lambda item: item[1]["best_score"], reverse=True)
+        return [
+            {"student_id": student_id, "rank": rank, **entry}
+            for rank, (student_id, entry) in enumerate(ranked[:LIVE_LEADERBOARD_SIZE], start=1)
+        ]
+
+    @staticmethod
+    def _encode(event: dict) -> str:
+        return orjson.dumps(event).decode()
+
+
+hub = LiveQuizHub()
+
+
+def load_leaderboard(quiz_id: int) -> dict:
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(
+                models.QuizAttempt.student_id,
+                User.fullname,
+                func.max(models.QuizAttempt.score),
+                func.count(models.QuizAttempt.id),
+            )
+            .join(User, models.QuizAttempt.student_id == User.id)
+            .filter(models.QuizAttempt.quiz_id == quiz_id)
+            .group_by(models.QuizAttempt.student_id, User.fullname)
+            .all()
+        )
+        # Latest score per student is not needed for ranking, so the best stands in for it
+        return {
+            student_id: {
+                "student_name": fullname or "Unknown Student",
+                "best_score": best or 0,
+                "last_score": best or 0,
+                "attempts": attempts,
+            }
+            for student_id, fullname, best, attempts in rows
+        }
+    finally:
+        db.close()
+
+
+def authorize_live_session(token: str, quiz_id: int):
+    db = SessionLocal()
+    try:
+        user = get_current_user(token=token, db=db)
+        global_subscription_guard(user=user, db=db)
+
+        # Same school check as the analytics endpoint
+        quiz = db.query(models.GeneratedQuiz).join(models.Subject).filter(
+            models.GeneratedQuiz.id == quiz_id,
+            models.Subject.school_id == user.school_id
+        ).first()
+        if not quiz:
+            raise HTTPException(404, "Quiz not found or unauthorized")
+        return user
+    finally:
+        db.close()
+
+
+async def receive_token(websocket: WebSocket) -> str:
+    try:
+        return str(orjson.loads(await websocket.receive_text())["token"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(401, 'First message must be {"token": ...}')
+
+
+@router.websocket("/quizzes/{quiz_id}/live")
+async def live_quiz_session(websocket: WebSocket, quiz_id: int):
+    await websocket.accept()
+    try:
+        token = await asyncio.wait_for(receive_token(websocket), LIVE_AUTH_TIMEOUT)
+        await run_in_threadpool(authorize_live_session, token, quiz_id)
+    except (HTTPException, asyncio.TimeoutError):
+        await websocket.close(code=POLICY_VIOLATION)
+        return
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        # e.g. the database is down; close cleanly instead of an unhandled ASGI error
+        print(f"DEBUG: Live session authorization failed for quiz {quiz_id}: {e}")
+        await websocket.close(code=INTERNAL_ERROR)
+        return
+
+    try:
+        subscriber = await hub.join(quiz_id, websocket)
+    except Exception as e:
+        print(f"DEBUG: Live leaderboard load failed for quiz {quiz_id}: {e}")
+        await websocket.close(code=INTERNAL_ERROR)
+        return
+
+    sender = asyncio.create_task(hub.pump(subscriber))
+    try:
+        # Clients only listen; reading keeps the connection alive and detects disconnects
+        while True:
+            await websocket.receive_text()
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        sender.cancel()
+        hub.leave(quiz_id, subscriber)
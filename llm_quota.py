@@ -0,0 +1,234 @@
+# services/llm_quota.py
+#
+# Every Gemma call (quiz generation and the chatbot) shares one API key and one
+# daily quota. This module rations it with limits kept in a local SQLite file,
+# so all uvicorn workers on the host share them:
+#
+#   model          requests per minute for the whole key (token bucket)
+#   feature:<name> daily budget per feature, so chat cannot starve quizzes
+#   school:<id>    daily budget per school (only when the caller passes
+#                  school_id; calls without one skip this budget)
+#
+# Daily budgets are fixed windows counted per calendar day in LLM_QUOTA_TZ
+# (the provider resets its daily quota at midnight Pacific time), so a
+# feature can never spend more than its budget in one provider day.
+#
+# Within a worker, callers wait in a priority queue (quiz generation ahead of
+# chat), and across workers chat must leave LLM_PRIORITY_RESERVE of the
+# per-minute bucket untouched. A 429/503 pauses every worker until the
+# Retry-After time has passed, then the call is retried.
+
+import heapq
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+# Next to this module by default, so every worker opens the same file whatever
+# directory it was started from
+QUOTA_DB = os.getenv("LLM_QUOTA_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_quota.sqlite3"))
+REQUESTS_PER_MINUTE = float(os.getenv("LLM_RPM", "30"))
+DAILY_PER_SCHOOL = float(os.getenv("LLM_DAILY_PER_SCHOOL", "2000"))
+QUOTA_TZ = ZoneInfo(os.getenv("LLM_QUOTA_TZ", "America/Los_Angeles"))
+PRIORITY_RESERVE = float(os.getenv("LLM_PRIORITY_RESERVE", "0.2"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+# Lower priority number is served first
+FEATURES = {
+    "quiz": {"priority": 0, "daily": float(os.getenv("LLM_DAILY_QUIZ", "4400")), "max_wait": 120},
+    "chat": {"priority": 10, "daily": float(os.getenv("LLM_DAILY_CHAT", "10000")), "max_wait": 20},
+}
+
+RETRYABLE_STATUS = (429, 503)
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after(result, attempt: int) -> float | None:
+    """
+    Seconds to wait before retrying, or None if `result` is not a 429/503.
+    Works for `requests` responses and for SDK errors exposing `.code`.
+    """
+    status = getattr(result, "status_code", None) or getattr(result, "code", None)
+    if status not in RETRYABLE_STATUS:
+        return None
+
+    headers = getattr(result, "headers", None) or getattr(getattr(result, "response", None), "headers", None) or {}
+    try:
+        return max(float(headers.get("Retry-After")), 1.0)
+    except (TypeError, ValueError):
+        # No usable header: exponential backoff
+        return 2.0 ** (attempt + 1)
+
+
+class LlmQuotaManager:
+    def __init__(self, path: str = QUOTA_DB):
+        self.path = path
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS pauses (key TEXT PRIMARY KEY, until REAL NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS daily_usage "
+                "(key TEXT NOT NULL, day TEXT NOT NULL, used INTEGER NOT NULL, PRIMARY KEY (key, day))"
+            )
+            # Past days are never read again
+            conn.execute("DELETE FROM daily_usage WHERE day < ?", (self._today()[0],))
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    @staticmethod
+    def _today():
+        """(current quota day as YYYY-MM-DD, seconds until it resets)."""
+        now = datetime.now(QUOTA_TZ)
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), QUOTA_TZ)
+        return now.date().isoformat(), (midnight - now).total_seconds()
+
+    def _daily_budgets(self, feature: str, school_id: int | None):
+        # (key, requests allowed per quota day)
+        budgets = [(f"feature:{feature}", FEATURES[feature]["daily"])]
+        if school_id is not None:
+            budgets.append((f"school:{school_id}", DAILY_PER_SCHOOL))
+        return budgets
+
+    def _try_take(self, feature: str, school_id: int | None):
+        """
+        Takes one request from the per-minute bucket and every daily budget,
+        or from none of them.
+        Returns (seconds to wait, whether a daily budget is the limit).
+        """
+        reserve = 0 if FEATURES[feature]["priority"] == 0 else REQUESTS_PER_MINUTE * PRIORITY_RESERVE
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+
+            paused = conn.execute("SELECT until FROM pauses WHERE key = 'model'").fetchone()
+            if paused and paused[0] > now:
+                conn.execute("ROLLBACK")
+                return paused[0] - now, False
+
+            day, until_reset = self._today()
+            budgets = self._daily_budgets(feature, school_id)
+            for key, limit in budgets:
+                row = conn.execute("SELECT used FROM daily_usage WHERE key = ? AND day = ?", (key, day)).fetchone()
+                if row and row[0] + 1 > limit:
+                    conn.execute("ROLLBACK")
+                    return until_reset, True
+
+            rate = REQUESTS_PER_MINUTE / 60
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = 'model'").fetchone()
+            tokens = REQUESTS_PER_MINUTE if row is None else min(REQUESTS_PER_MINUTE, row[0] + (now - row[1]) * rate)
+            if tokens < 1 + reserve:
+                conn.execute("ROLLBACK")
+                return (1 + reserve - tokens) / rate, False
+
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES ('model', ?, ?)",
+                (tokens - 1, now),
+            )
+            conn.executemany(
+                "INSERT INTO daily_usage (key, day, used) VALUES (?, ?, 1) "
+                "ON CONFLICT(key, day) DO UPDATE SET used = used + 1",
+                [(key, day) for key, _ in budgets],
+            )
+            conn.execute("COMMIT")
+            return 0.0, False
+        finally:
+            conn.close()
+
+    def acquire(self, feature: str, school_id: int | None = None):
+        """Blocks until a request may be sent, or raises QuotaExceeded."""
+        config = FEATURES[feature]
+        deadline = time.monotonic() + config["max_wait"]
+        ticket = (config["priority"], next(self._seq))
+
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+        try:
+            while True:
+                with self._cond:
+                    # Only the highest-priority waiter in this worker competes for tokens
+                    while self._waiting[0] != ticket:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise QuotaExceeded("LLM queue wait exceeded", 1.0)
+                        self._cond.wait(remaining)
+
+                wait, daily_limited = self._try_take(feature, school_id)
+                if wait == 0:
+                    return
+                if daily_limited:
+                    # Not worth waiting on: daily budgets only reset at midnight
+                    raise QuotaExceeded(f"Daily AI budget for {feature} used up", wait)
+                if time.monotonic() + wait > deadline:
+                    raise QuotaExceeded("LLM rate limit reached", wait)
+                time.sleep(min(wait, 1.0))
+        finally:
+            with self._cond:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Stops every worker from calling the model for `seconds` (after a 429/503)."""
+        until = time.time() + seconds
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO pauses (key, until) VALUES ('model', ?) "
+                "ON CONFLICT(key) DO UPDATE SET until = MAX(until, excluded.until)",
+                (until,),
+            )
+        finally:
+            conn.close()
+
+    def call(self, feature: str, send, school_id: int | None = None):
+        """
+        Runs `send()` once quota is available, retrying on 429/503.
+        Returns whatever `send()` returned on the final attempt.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            self.acquire(feature, school_id)
+            try:
+                result = send()
+            except Exception as e:
+                delay = retry_after(e, attempt)
+                if delay is None or attempt == MAX_RETRIES:
+                    raise
+            else:
+                delay = retry_after(result, attempt)
+                if delay is None or attempt == MAX_RETRIES:
+                    return result
+
+            print(f"DEBUG: LLM {feature} call throttled, retrying in {delay:.0f}s")
+            self.pause(delay)
+
+
+_quota = None
+_quota_lock = threading.Lock()
+
+
+def get_quota() -> LlmQuotaManager:
+    """The process-wide manager, created on first use so importing this module touches no files."""
+    global _quota
+    with _quota_lock:
+        if _quota is None:
+            _quota = LlmQuotaManager()
+        return _quota
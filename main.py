@@ -1,29 +1,49 @@
+import os
+import asyncio
+from importlib import import_module
+
 from fastapi import FastAPI, Depends # Added Depends
+from starlette.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
+# Load .env once, before any service module reads os.environ at import time
+load_dotenv()
+
 # Import the guard you created
 from services.auth_service.dependencies import global_subscription_guard
 
-# Routers
-from services.auth_service.routes import router as auth_router
-from services.quizzes_service.routes import router as quizzes_router
-from services.chat_message_service.routes import router as chat_router
-from services.schools_service.routes import router as schools_router
-from services.channels_service.routes import router as channels_router
-from services.channels_service.views.routes import router as content_views_router
-from services.channels_service.reactions.routes import router as content_reactions_router
-from services.channels_service.comments.routes import router as content_comments_router
-from services.channels_service.comments.reactions.routes import router as comment_reactions_router
-from services.channels_service.followers.routes import router as followers_router
-from services.competitions_service.routes import router as competitions_router
-from services.chatbot_service.routes import router as chatbot_router
-from services.system_subscription_service.routes import router as subscription_router
-from services.subjects_service.routes import router as subjects_router
-from services.sms_service.routes import router as sms_router
+# Routers, in registration order: (module, locked behind the subscription guard)
+ROUTERS = [
+    # --- UNRESTRICTED ROUTERS (Everyone can access) ---
+    ("services.auth_service.routes", False),
+    ("services.system_subscription_service.routes", False), # Must be open so they can pay!
+    ("services.schools_service.routes", False),
+    ("services.sms_service.routes", False),
+    ("services.chat_message_service.routes", False),
+    # --- RESTRICTED ROUTERS (Students must be subscribed) ---
+    ("services.channels_service.routes", True),
+    ("services.chatbot_service.routes", True),
+    ("services.subjects_service.routes", True),
+    ("services.subjects_service.live", False), # Live quiz sockets authenticate and check subscriptions themselves
+    ("services.competitions_service.routes", True),
+    ("services.quizzes_service.routes", True),
+    # Channel sub-features (Also restricted)
+    ("services.channels_service.views.routes", True),
+    ("services.channels_service.reactions.routes", True),
+    ("services.channels_service.comments.routes", True),
+    ("services.channels_service.comments.reactions.routes", True),
+    ("services.channels_service.followers.routes", True),
+]
 
-load_dotenv()
+# Routers that pull in LLM SDKs. With EDUSA_LAZY_ROUTERS=1 they are imported and
+# registered on the first request under their prefix instead of at worker boot.
+LAZY_ROUTERS = {
+    "/chatbot": "services.chatbot_service.routes",
+}
+
+LAZY_MODE = os.getenv("EDUSA_LAZY_ROUTERS", "0") == "1"
 
 app = FastAPI(title="EduSA API")
 
@@ -39,30 +59,49 @@ app.add_middleware(
 # Static files
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
-# --- UNRESTRICTED ROUTERS (Everyone can access) ---
-app.include_router(auth_router)
-app.include_router(subscription_router) # Must be open so they can pay!
-app.include_router(schools_router)
-app.include_router(sms_router)
-
-# --- RESTRICTED ROUTERS (Students must be subscribed) ---
-# We apply the guard to all these routers at once
+# We apply the guard to all restricted routers at once
 locked_deps = [Depends(global_subscription_guard)]
 
-app.include_router(chat_router)
-app.include_router(channels_router, dependencies=locked_deps)
-app.include_router(chatbot_router, dependencies=locked_deps)
-app.include_router(subjects_router, dependencies=locked_deps)
-app.include_router(competitions_router, dependencies=locked_deps)
-app.include_router(quizzes_router, dependencies=locked_deps)
+def register_router(module_name: str, locked: bool, module=None):
+    router = (module or import_module(module_name)).router
+    app.include_router(router, dependencies=locked_deps if locked else None)
+
+deferred = set(LAZY_ROUTERS.values()) if LAZY_MODE else set()
+for module_name, locked in ROUTERS:
+    if module_name not in deferred:
+        register_router(module_name, locked)
+
+if LAZY_MODE:
+    _lazy_lock = asyncio.Lock()
+    _pending = dict(LAZY_ROUTERS)
+
+    async def load_lazy_router(prefix: str):
+        # Concurrent first requests wait here instead of importing twice
+        async with _lazy_lock:
+            module_name = _pending.get(prefix)
+            if module_name:
+                # The import is the slow part; keep it off the event loop
+                module = await run_in_threadpool(import_module, module_name)
+                register_router(module_name, dict(ROUTERS)[module_name], module)
+                del _pending[prefix]
+                # Regenerate /docs so the new routes show up
+                app.openapi_schema = None
+
+    class LazyRouterMiddleware:
+        # Plain ASGI rather than BaseHTTPMiddleware: once every lazy router is
+        # loaded, a request costs one dict check on its way through
+        def __init__(self, app):
+            self.app = app
+
+        async def __call__(self, scope, receive, send):
+            if _pending and scope["type"] in ("http", "websocket"):
+                path = scope["path"]
+                for prefix in [p for p in _pending if path == p or path.startswith(p + "/")]:
+                    await load_lazy_router(prefix)
+            await self.app(scope, receive, send)
 
-# Channel sub-features (Also restricted)
-app.include_router(content_views_router, dependencies=locked_deps)
-app.include_router(content_reactions_router, dependencies=locked_deps)
-app.include_router(content_comments_router, dependencies=locked_deps)
-app.include_router(comment_reactions_router, dependencies=locked_deps)
-app.include_router(followers_router, dependencies=locked_deps)
+    app.add_middleware(LazyRouterMiddleware)
 
 @app.get("/")
 def root():
-    return {"message": "EduSA backend running 🚀"}
\ No newline at end of file
+    return {"message": "EduSA backend running 🚀"}
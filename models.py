@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Text, TIMESTAMP, func
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Text, TIMESTAMP, UniqueConstraint, func
 from sqlalchemy.orm import relationship
 from services.database import Base
 
@@ -95,4 +95,25 @@ class ManualTestResult(Base):
     created_at = Column(DateTime, server_default=func.now())
 
     student = relationship("User")
-    subject = relationship("Subject")
\ No newline at end of file
+    subject = relationship("Subject")
+
+# Per-(student, subject) running totals over quiz attempts and manual marks, so
+# dashboards read one row instead of aggregating history. Kept current by
+# progress.record_score in the same transaction as each write.
+class StudentSubjectProgress(Base):
+    __tablename__ = "student_subject_progress"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    student_id = Column(Integer, ForeignKey("users.id", name="fk_progress_student", ondelete="CASCADE"), nullable=False)
+    subject_id = Column(Integer, ForeignKey("subjects.id", name="fk_progress_subject", ondelete="CASCADE"), nullable=False, index=True)
+    attempt_count = Column(Integer, nullable=False, default=0)
+    total_score = Column(Float, nullable=False, default=0)
+    average_score = Column(Float)
+    best_score = Column(Float)
+    latest_score = Column(Float)
+    last_activity = Column(DateTime)
+
+    # Also serves lookups by student_id alone (leftmost column)
+    __table_args__ = (
+        UniqueConstraint("student_id", "subject_id", name="uq_progress_student_subject"),
+    )
\ No newline at end of file
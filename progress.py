@@ -0,0 +1,128 @@
+from sqlalchemy import select, union_all, insert, delete, func, case
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session
+from services.database import SessionLocal
+from services.auth_service.models import User
+from . import models
+
+# Materialised per-(student, subject) progress for dashboards.
+#
+# record_score() upserts the summary row inside the caller's transaction, so
+# it commits or rolls back together with the attempt or mark it describes.
+# rebuild_progress() recomputes every row from history; run it nightly, e.g.
+#     0 2 * * * cd /srv/edusa && python -m services.subjects_service.progress
+#
+# Nothing else creates tables, so the same command is a required deploy step:
+# run it once BEFORE starting the new code. It creates student_subject_progress
+# if missing (record_score would otherwise fail and roll back every quiz
+# submission and manual mark) and fills it from history.
+
+Progress = models.StudentSubjectProgress
+
+
+def record_score(db: Session, student_id: int, subject_id: int, score: float):
+    """Adds one score to the summary. Call before db.commit()."""
+    stmt = mysql_insert(Progress).values(
+        student_id=student_id,
+        subject_id=subject_id,
+        attempt_count=1,
+        total_score=score,
+        average_score=score,
+        best_score=score,
+        latest_score=score,
+        last_activity=func.now(),
+    )
+    # MariaDB applies these in order and later ones see earlier results,
+    # so average_score must come before total_score and attempt_count change
+    stmt = stmt.on_duplicate_key_update([
+        ("average_score", (Progress.total_score + score) / (Progress.attempt_count + 1)),
+        ("total_score", Progress.total_score + score),
+        ("attempt_count", Progress.attempt_count + 1),
+        ("best_score", func.greatest(func.coalesce(Progress.best_score, score), score)),
+        ("latest_score", score),
+        ("last_activity", func.now()),
+    ])
+    db.execute(stmt)
+
+
+def create_table(db: Session):
+    """Creates student_subject_progress if it does not exist yet."""
+    Progress.__table__.create(bind=db.get_bind(), checkfirst=True)
+
+
+def rebuild_progress(db: Session):
+    """Recomputes every summary row from quiz attempts and manual marks in one transaction."""
+    marks = union_all(
+        select(
+            models.QuizAttempt.student_id.label("student_id"),
+            models.GeneratedQuiz.subject_id.label("subject_id"),
+            models.QuizAttempt.score.label("score"),
+            models.QuizAttempt.created_at.label("created_at"),
+        ).join(models.GeneratedQuiz, models.QuizAttempt.quiz_id == models.GeneratedQuiz.id),
+        select(
+            models.ManualTestResult.student_id,
+            models.ManualTestResult.subject_id,
+            models.ManualTestResult.marks,
+            models.ManualTestResult.created_at,
+        ),
+    ).subquery()
+
+    ranked = select(
+        marks,
+        func.row_number().over(
+            partition_by=(marks.c.student_id, marks.c.subject_id),
+            order_by=marks.c.created_at.desc()
+        ).label("recency"),
+    ).subquery()
+
+    summary = select(
+        ranked.c.student_id,
+        ranked.c.subject_id,
+        func.count(ranked.c.score),
+        func.coalesce(func.sum(ranked.c.score), 0),
+        func.avg(ranked.c.score),
+        func.max(ranked.c.score),
+        func.max(case((ranked.c.recency == 1, ranked.c.score))),
+        func.max(ranked.c.created_at),
+    ).where(ranked.c.student_id.is_not(None), ranked.c.subject_id.is_not(None)).group_by(
+        ranked.c.student_id, ranked.c.subject_id
+    )
+
+    # Readers keep seeing the old rows until this commits
+    db.execute(delete(Progress))
+    db.execute(insert(Progress).from_select(
+        ["student_id", "subject_id", "attempt_count", "total_score",
+         "average_score", "best_score", "latest_score", "last_activity"],
+        summary,
+    ))
+    db.commit()
+
+
+def student_progress(db: Session, student_id: int):
+    return (
+        db.query(Progress, models.Subject.name)
+        .join(models.Subject, Progress.subject_id == models.Subject.id)
+        .filter(Progress.student_id == student_id)
+        .order_by(models.Subject.name)
+        .all()
+    )
+
+
+def subject_progress(db: Session, subject_id: int):
+    return (
+        db.query(Progress, User.fullname)
+        .join(User, Progress.student_id == User.id)
+        .filter(Progress.subject_id == subject_id)
+        .order_by(Progress.average_score.desc())
+        .all()
+    )
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        create_table(db)
+        rebuild_progress(db)
+        print(f"Rebuilt {db.query(Progress).count()} progress rows")
+    finally:
+        db.close()
@@ -0,0 +1,280 @@
+import gzip
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from sqlalchemy.orm import Session
+from services.database import SessionLocal
+from . import models
+
+# In-process BM25 index over generated_questions (question text + quiz topic).
+# generate_quiz fills a quiz from matching questions already written for the
+# same school and only asks the LLM for the shortfall.
+#
+# The index is restored at startup from a gzipped JSON snapshot and brought up
+# to date with a `WHERE id > max_id` query, which is also run after every
+# insert, so rows written by other workers are picked up too.
+#
+# That catch-up only ever adds rows: a question deleted or corrected in
+# generated_questions stays in the index and the snapshot, and keeps being
+# reused. After such edits, rebuild the index from the database (ignoring the
+# snapshot) and restart the workers:
+#     python -m services.subjects_service.question_bank
+
+SNAPSHOT_PATH = os.getenv("QUESTION_BANK_SNAPSHOT", "question_bank.json.gz")
+# Share of the topic's words a stored question must contain to be reused
+MIN_COVERAGE = float(os.getenv("QUESTION_BANK_MIN_COVERAGE", "0.75"))
+# Jaccard similarity of content words above which two questions count as the same
+NEAR_DUPLICATE = float(os.getenv("QUESTION_BANK_NEAR_DUPLICATE", "0.7"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "in", "is", "it",
+    "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "which", "with",
+    "what", "who", "whom", "when", "where", "why", "how", "does", "do", "did", "following",
+}
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> list[str]:
+    return WORD.findall((text or "").lower())
+
+
+def tokenize(text: str) -> list[str]:
+    return [w for w in normalize(text) if w not in STOPWORDS and len(w) > 1]
+
+
+def shingles(text: str) -> frozenset:
+    # Content words only, so "absorb in" and "absorb during" still match
+    return frozenset(tokenize(text)) or frozenset(normalize(text))
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class QuestionBank:
+    def __init__(self, snapshot_path: str = SNAPSHOT_PATH):
+        self.snapshot_path = snapshot_path
+        self.max_id = 0
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        # doc id -> snapshot row [id, school_id, subject_id, topic, question, a, b, c, d, answer]
+        self._rows = {}
+        self._lengths = {}
+        self._shingles = {}
+        self._postings = defaultdict(dict)  # term -> {doc id: term frequency}
+        self._fingerprints = set()
+        self._total_length = 0
+
+    # --- building ---
+
+    def _add_row(self, row: list):
+        doc_id, school_id, _, topic, question = row[:5]
+        self.max_id = max(self.max_id, doc_id)
+
+        # Copies of reused questions are stored again under the new quiz; index each text once per school
+        fingerprint = (school_id, hashlib.blake2b(" ".join(normalize(question)).encode(), digest_size=8).digest())
+        if fingerprint in self._fingerprints:
+            return
+        self._fingerprints.add(fingerprint)
+
+        terms = Counter(tokenize(question) + tokenize(topic))
+        for term, tf in terms.items():
+            self._postings[term][doc_id] = tf
+        length = sum(terms.values())
+        self._rows[doc_id] = row
+        self._lengths[doc_id] = length
+        self._shingles[doc_id] = shingles(question)
+        self._total_length += length
+
+    def load(self, db: Session):
+        """
+        Restores the snapshot (if any) and catches up from the database.
+        The snapshot is rewritten on a background thread, and only if the
+        catch-up found new rows, so startup never waits on the write.
+        """
+        with self._lock:
+            if os.path.exists(self.snapshot_path):
+                try:
+                    with gzip.open(self.snapshot_path, "rt", encoding="utf-8") as f:
+                        snapshot = json.load(f)
+                    for row in snapshot["rows"]:
+                        self._add_row(row)
+                    self.max_id = max(self.max_id, snapshot["max_id"])
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"DEBUG: Question bank snapshot unreadable, rebuilding: {e}")
+        if self.refresh(db):
+            threading.Thread(target=self.save, daemon=True).start()
+
+    def refresh(self, db: Session) -> int:
+        """Indexes every question with an id above the last one seen. Returns how many rows were read."""
+        # One catch-up at a time, so rows are not read twice
+        with self._refresh_lock:
+            query = (
+                db.query(
+                    models.GeneratedQuestion.id,
+                    models.Subject.school_id,
+                    models.GeneratedQuiz.subject_id,
+                    models.GeneratedQuiz.topic,
+                    models.GeneratedQuestion.question,
+                    models.GeneratedQuestion.option_a,
+                    models.GeneratedQuestion.option_b,
+                    models.GeneratedQuestion.option_c,
+                    models.GeneratedQuestion.option_d,
+                    models.GeneratedQuestion.correct_answer,
+                )
+                .join(models.GeneratedQuiz, models.GeneratedQuestion.quiz_id == models.GeneratedQuiz.id)
+                .join(models.Subject, models.GeneratedQuiz.subject_id == models.Subject.id)
+                .filter(models.GeneratedQuestion.id > self.max_id)
+                .order_by(models.GeneratedQuestion.id)
+                .yield_per(1000)
+            )
+            added = 0
+            batch = []
+            # Rows are read without the index lock so find() never waits on the database
+            for row in query:
+                batch.append(list(row))
+                if len(batch) == 1000:
+                    added += self._add_rows(batch)
+                    batch = []
+            added += self._add_rows(batch)
+        return added
+
+    def _add_rows(self, rows: list) -> int:
+        with self._lock:
+            for row in rows:
+                self._add_row(row)
+        return len(rows)
+
+    def rebuild(self, db: Session):
+        """Reindexes every question from the database, dropping rows that no longer exist, and rewrites the snapshot."""
+        fresh = QuestionBank(self.snapshot_path)
+        with self._refresh_lock:
+            fresh.refresh(db)
+            with self._lock:
+                for name in ("max_id", "_rows", "_lengths", "_shingles", "_postings", "_fingerprints", "_total_length"):
+                    setattr(self, name, getattr(fresh, name))
+        self.save()
+
+    def save(self):
+        with self._lock:
+            snapshot = {"max_id": self.max_id, "rows": list(self._rows.values())}
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        # Several workers may save at once; each replace is atomic
+        os.replace(tmp_path, self.snapshot_path)
+
+    # --- querying ---
+
+    def _score(self, topic: str, school_id: int | None, exclude: set):
+        query = set(tokenize(topic))
+        if not query or not self._rows:
+            return []
+
+        docs = len(self._rows)
+        avg_length = self._total_length / docs
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for term in query:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                if doc_id in exclude or self._rows[doc_id][1] != school_id:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+                matched[doc_id] += 1
+
+        needed = MIN_COVERAGE * len(query)
+        return sorted(
+            (doc_id for doc_id in scores if matched[doc_id] >= needed),
+            key=lambda doc_id: scores[doc_id],
+            reverse=True,
+        )
+
+    def find(self, topic: str, count: int, school_id: int | None, exclude: set | None = None) -> list[dict]:
+        """
+        Up to `count` stored questions matching `topic`, most relevant first,
+        with near-duplicates of already chosen questions skipped.
+        Chosen ids are added to `exclude` so a batch never reuses one twice.
+        """
+        exclude = exclude if exclude is not None else set()
+        chosen = []
+        with self._lock:
+            for doc_id in self._score(topic, school_id, exclude):
+                if len(chosen) == count:
+                    break
+                if any(similarity(self._shingles[doc_id], self._shingles[c]) >= NEAR_DUPLICATE for c in chosen):
+                    continue
+                chosen.append(doc_id)
+                exclude.add(doc_id)
+            return [self._as_question(self._rows[doc_id]) for doc_id in chosen]
+
+    def drop_near_duplicates(
+        self, questions: list, accepted: list[dict], school_id: int | None, check_bank: bool = True
+    ) -> list:
+        """
+        Filters fresh LLM questions that repeat `accepted` ones or, with
+        `check_bank`, questions already in the bank.
+        """
+        seen = [shingles(q["question"]) for q in accepted]
+        kept = []
+        with self._lock:
+            for q in questions:
+                if not isinstance(q, dict) or not isinstance(q.get("question"), str):
+                    kept.append(q)  # Left for the caller's validation to reject
+                    continue
+                current = shingles(q["question"])
+                similar = self._score(q["question"], school_id, set())[:5] if check_bank else []
+                if any(similarity(current, s) >= NEAR_DUPLICATE for s in seen) or any(
+                    similarity(current, self._shingles[doc_id]) >= NEAR_DUPLICATE for doc_id in similar
+                ):
+                    continue
+                seen.append(current)
+                kept.append(q)
+        return kept
+
+    @staticmethod
+    def _as_question(row: list) -> dict:
+        # Same shape as the LLM output so question_rows() handles both
+        _, _, _, _, question, a, b, c, d, answer = row
+        return {"question": question, "options": {"A": a, "B": b, "C": c, "D": d}, "answer": answer}
+
+
+bank = QuestionBank()
+
+
+def warm():
+    db = SessionLocal()
+    try:
+        bank.load(db)
+    except Exception as e:
+        # Quizzes still generate without the bank; the next insert retries the catch-up
+        print(f"DEBUG: Question bank not loaded: {e}")
+    finally:
+        db.close()
+
+
+def persist():
+    bank.save()
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        bank.rebuild(db)
+        print(f"Indexed {len(bank._rows)} questions into {bank.snapshot_path}")
+    finally:
+        db.close()
@@ -1,20 +1,55 @@
 import os
+import asyncio
 import requests
-import json
-import re
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from . import models 
-from dotenv import load_dotenv
-
-load_dotenv()
+from services.llm_quota import get_quota
+from .question_bank import bank
+from .quiz_parser import parse_questions, strict_parse_ok, stats
 
+# .env is loaded once by main.py before the routers are imported
 API_KEY = os.getenv("GOOGLE_API_KEY") 
 
-def generate_quiz(quiz_id: int, topic: str, db: Session):
-    num_questions = 5
+# Larger requests are split into parallel calls of at most this many questions
+MAX_QUESTIONS_PER_CALL = int(os.getenv("QUIZ_GEN_MAX_PER_CALL", "10"))
+# Upper bound on LLM calls in flight for one batch request
+QUIZ_GEN_CONCURRENCY = int(os.getenv("QUIZ_GEN_CONCURRENCY", "4"))
+# Follow-up calls for questions missing from a partly broken response
+QUIZ_GEN_MAX_REREQUESTS = int(os.getenv("QUIZ_GEN_MAX_REREQUESTS", "2"))
+
+def request_questions(topic: str, num_questions: int, school_id: int | None = None, accept=None) -> list[dict]:
+    """
+    Asks Gemma for `num_questions` questions. Every valid question in a
+    response is kept even if the rest is malformed; only the missing number is
+    requested again. `accept(found, kept)` may filter each response (e.g.
+    near-duplicates), and what it drops is requested again too.
+    May return fewer questions (or []) if calls keep failing.
+    """
+    questions = []
+    for attempt in range(QUIZ_GEN_MAX_REREQUESTS + 1):
+        missing = num_questions - len(questions)
+        if missing <= 0:
+            break
+        if attempt:
+            stats.record_rerequest()
+
+        raw_text = call_llm(topic, missing, school_id)
+        if raw_text is None:
+            break
+
+        found, parser = parse_questions(raw_text)
+        stats.record(missing, parser, strict_parse_ok(raw_text))
+        if accept:
+            found = accept(found, questions)
+        questions += found[:missing]
+    return questions
+
+def call_llm(topic: str, num_questions: int, school_id: int | None = None) -> str | None:
+    """Raw model output, or None if the call fails."""
     # Using Gemma 3 because it has a higher free quota on your account
     endpoint = f"https://generativelanguage.googleapis.com/v1beta/models/gemma-3-27b-it:generateContent?key={API_KEY}"
-    
+
     prompt = (
         f"Generate a {num_questions} question multiple-choice quiz about {topic}. "
         "Return ONLY a JSON array. Each object must have: "
@@ -30,38 +65,135 @@ def generate_quiz(quiz_id: int, topic: str, db: Session):
     }
 
     try:
-        response = requests.post(endpoint, json=payload, timeout=30)
-        
+        # Shares the Gemma quota with the chatbot; quiz generation is served first
+        response = get_quota().call(
+            "quiz",
+            lambda: requests.post(endpoint, json=payload, timeout=30),
+            school_id=school_id
+        )
+
         if response.status_code != 200:
             print(f"DEBUG: Status {response.status_code} - {response.text}")
-            return False
+            return None
 
         data = response.json()
-        raw_text = data['candidates'][0]['content']['parts'][0]['text']
-        
-        # Robust JSON cleaning for Gemma
-        clean_json = re.sub(r'^```json\s*|```$', '', raw_text.strip(), flags=re.MULTILINE)
-        questions = json.loads(clean_json)
-
-        # Database saving logic moved here (after parsing JSON)
-        if questions:
-            for q_data in questions:
-                new_question = models.GeneratedQuestion(
-                    quiz_id=quiz_id,
-                    question=q_data["question"],
-                    option_a=q_data["options"]["A"],
-                    option_b=q_data["options"]["B"],
-                    option_c=q_data["options"]["C"],
-                    option_d=q_data["options"]["D"],
-                    correct_answer=q_data["answer"]
-                )
-                db.add(new_question)
-            
-            db.commit()
-            return True
-            
+        return data['candidates'][0]['content']['parts'][0]['text']
+
+    except Exception as e:
+        print(f"DEBUG: Error: {e}")
+        return None
+
+def question_rows(quiz_id: int, questions: list[dict]) -> list[dict]:
+    return [
+        {
+            "quiz_id": quiz_id,
+            "question": q_data["question"],
+            "option_a": q_data["options"]["A"],
+            "option_b": q_data["options"]["B"],
+            "option_c": q_data["options"]["C"],
+            "option_d": q_data["options"]["D"],
+            "correct_answer": q_data["answer"],
+        }
+        for q_data in questions
+    ]
+
+def save_questions(rows: list[dict], db: Session):
+    # One executemany INSERT instead of one ORM object per question
+    if rows:
+        db.execute(insert(models.GeneratedQuestion), rows)
+        db.commit()
+        bank.refresh(db)
+
+def generate_quiz(
+    quiz_id: int,
+    topic: str,
+    db: Session,
+    school_id: int | None = None,
+    num_questions: int = 5,
+    reuse_existing: bool = True
+):
+    try:
+        # Fill from the question bank first; the LLM only writes the shortfall
+        questions = bank.find(topic, num_questions, school_id) if reuse_existing else []
+        if len(questions) < num_questions:
+            # Bank questions can only repeat when the bank was searched
+            def accept(found, kept):
+                return bank.drop_near_duplicates(found, questions + kept, school_id, check_bank=reuse_existing)
+
+            # Same per-call limit as the batch endpoint
+            for count in split_count(num_questions - len(questions)):
+                questions += request_questions(topic, count, school_id, accept)
+
+        rows = question_rows(quiz_id, questions[:num_questions])
+        save_questions(rows, db)
+        return bool(rows)
     except Exception as e:
         print(f"DEBUG: Error: {e}")
         return False
-        
-    return False
\ No newline at end of file
+
+def split_count(num_questions: int) -> list[int]:
+    # 23 -> [10, 10, 3]
+    full, rest = divmod(num_questions, MAX_QUESTIONS_PER_CALL)
+    return [MAX_QUESTIONS_PER_CALL] * full + ([rest] if rest else [])
+
+async def generate_quiz_batch(
+    jobs: list[tuple[int, str, int, bool]],
+    db: Session,
+    school_id: int | None = None,
+    concurrency: int | None = None
+) -> dict[int, int]:
+    """
+    Generates questions for several quizzes at once.
+    `jobs` holds (quiz_id, topic, number_of_questions, reuse_existing). Each
+    quiz is first filled from the question bank if allowed; the shortfall is
+    split into calls of at most MAX_QUESTIONS_PER_CALL questions, all run on
+    worker threads with at most `concurrency` in flight, and every resulting
+    row is written in a single bulk insert. Returns quiz_id -> questions saved.
+    """
+    limit = asyncio.Semaphore(max(1, min(concurrency or QUIZ_GEN_CONCURRENCY, QUIZ_GEN_CONCURRENCY)))
+    # Bank work takes the index lock and scores BM25, so it stays off the event loop too
+    def find_reused():
+        used = set()  # Bank questions already given to a quiz in this batch
+        return {
+            quiz_id: bank.find(topic, num_questions, school_id, exclude=used) if reuse else []
+            for quiz_id, topic, num_questions, reuse in jobs
+        }
+
+    def combine(chunks):
+        questions = {quiz_id: list(found) for quiz_id, found in reused.items()}
+        for quiz_id, fresh in chunks:
+            # Chunks of one quiz ran in parallel, so they can still repeat each other
+            questions[quiz_id] += bank.drop_near_duplicates(fresh, questions[quiz_id], school_id, check_bank=False)
+
+        rows = []
+        for quiz_id, quiz_questions in questions.items():
+            try:
+                rows += question_rows(quiz_id, quiz_questions)
+            except (KeyError, TypeError) as e:
+                print(f"DEBUG: Malformed question for quiz {quiz_id}: {e}")
+        save_questions(rows, db)
+        return rows
+
+    reused = await asyncio.to_thread(find_reused)
+
+    async def run(quiz_id: int, topic: str, count: int, reuse: bool):
+        # Duplicates of the bank or of this quiz's reused questions are requested again
+        def accept(found, kept):
+            return bank.drop_near_duplicates(found, reused[quiz_id] + kept, school_id, check_bank=reuse)
+
+        async with limit:
+            questions = await asyncio.to_thread(request_questions, topic, count, school_id, accept)
+        return quiz_id, questions[:count]
+
+    chunks = await asyncio.gather(*(
+        run(quiz_id, topic, count, reuse)
+        for quiz_id, topic, num_questions, reuse in jobs
+        for count in split_count(num_questions - len(reused[quiz_id]))
+    ))
+
+    rows = await asyncio.to_thread(combine, chunks)
+
+    saved = {quiz_id: 0 for quiz_id, *_ in jobs}
+    for row in rows:
+        saved[row["quiz_id"]] += 1
+    return saved
\ No newline at end of file
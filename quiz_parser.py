@@ -0,0 +1,192 @@
+import json
+import re
+import threading
+from pydantic import ValidationError
+from .schemas import GeneratedQuestionPayload
+
+# Tolerant parser for LLM quiz output. Instead of json.loads on the whole
+# response (where one bad object loses every question), it scans the text for
+# balanced top-level {...} objects and validates each one on its own, so every
+# well-formed question survives stray prose, markdown fences, trailing commas,
+# truncated output or a single broken object.
+#
+# A nested object with a "question" key is a question in its own right, so the
+# scan restarts there. That covers an unclosed object swallowing the questions
+# after it, and wrappers like {"questions": [...]}, whose items are parsed one
+# by one.
+
+QUESTION_KEY = '"question"'
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"'})
+
+
+def _load_object(text: str):
+    for candidate in (text, TRAILING_COMMA.sub(r"\1", text)):
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            pass
+    try:
+        # Curly quotes around keys/values; only tried once everything else failed
+        return json.loads(TRAILING_COMMA.sub(r"\1", text.translate(SMART_QUOTES)))
+    except ValueError:
+        return None
+
+
+class QuestionStreamParser:
+    """
+    Incremental: feed() can be called with arbitrary chunks of a streamed
+    response and returns the questions completed by that chunk.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._starts = []  # Buffer index of each open object
+        self._string_start = 0
+        self._last_key = None  # Last string closed, until something other than whitespace follows
+        self._has_question = False  # The outermost object has its own "question" key
+        self.objects = 0
+        self.valid = 0
+
+    def feed(self, chunk: str) -> list[dict]:
+        found = []
+        for ch in chunk:
+            if self._depth == 0:
+                # Outside any object: skip array brackets, commas, prose, fences
+                if ch == "{":
+                    self._buffer = [ch]
+                    self._depth = 1
+                    self._starts = [0]
+                    self._last_key = None
+                    self._has_question = False
+                continue
+
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    # Only a string as long as "question" needs joining
+                    if len(self._buffer) - self._string_start == len(QUESTION_KEY):
+                        self._last_key = "".join(self._buffer[self._string_start:])
+                continue
+
+            if ch.isspace():
+                continue
+            if ch == ":" and self._last_key == QUESTION_KEY:
+                if self._depth == 1:
+                    self._has_question = True
+                else:
+                    self._restart()
+            self._last_key = None
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = len(self._buffer) - 1
+            elif ch == "{":
+                self._depth += 1
+                self._starts.append(len(self._buffer) - 1)
+            elif ch == "}":
+                self._depth -= 1
+                self._starts.pop()
+                if self._depth == 0:
+                    question = self._finish("".join(self._buffer))
+                    if question:
+                        found.append(question)
+        return found
+
+    def _restart(self):
+        # The enclosing object is either a wrapper or a question left unclosed
+        if self._has_question:
+            self.objects += 1
+        self._buffer = self._buffer[self._starts[-1]:]
+        self._depth = 1
+        self._starts = [0]
+        self._has_question = True
+
+    def _finish(self, text: str):
+        self.objects += 1
+        data = _load_object(text)
+        if not isinstance(data, dict):
+            return None
+        try:
+            question = GeneratedQuestionPayload.model_validate(data).model_dump()
+        except ValidationError:
+            return None
+        self.valid += 1
+        return question
+
+
+def parse_questions(text: str) -> tuple[list[dict], QuestionStreamParser]:
+    parser = QuestionStreamParser()
+    return parser.feed(text), parser
+
+
+def strict_parse_ok(text: str) -> bool:
+    """Whether the old all-or-nothing parsing would have accepted `text`."""
+    clean_json = re.sub(r'^```json\s*|```$', '', text.strip(), flags=re.MULTILINE)
+    try:
+        questions = json.loads(clean_json)
+        return all(
+            {"question", "options", "answer"} <= q_data.keys() and set("ABCD") <= q_data["options"].keys()
+            for q_data in questions
+        )
+    except Exception:
+        return False
+
+
+class SalvageStats:
+    """Process-wide counters for the generation-stats endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.questions_requested = 0
+        self.questions_parsed = 0
+        # Responses the old json.loads path would have thrown away entirely
+        self.broken_responses = 0
+        self.broken_questions_requested = 0
+        self.questions_salvaged = 0
+        self.objects_rejected = 0
+        self.rerequests = 0
+
+    def record(self, requested: int, parser: QuestionStreamParser, strict_ok: bool):
+        with self._lock:
+            self.responses += 1
+            self.questions_requested += requested
+            self.questions_parsed += parser.valid
+            self.objects_rejected += parser.objects - parser.valid
+            if not strict_ok:
+                self.broken_responses += 1
+                self.broken_questions_requested += requested
+                self.questions_salvaged += min(parser.valid, requested)
+
+    def record_rerequest(self):
+        with self._lock:
+            self.rerequests += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "responses": self.responses,
+                "questions_requested": self.questions_requested,
+                "questions_parsed": self.questions_parsed,
+                "broken_responses": self.broken_responses,
+                "questions_salvaged": self.questions_salvaged,
+                "objects_rejected": self.objects_rejected,
+                "rerequests": self.rerequests,
+                # Share of questions in broken responses that were kept instead of discarded
+                "salvage_rate": (
+                    self.questions_salvaged / self.broken_questions_requested
+                    if self.broken_questions_requested else 0.0
+                ),
+            }
+
+
+stats = SalvageStats()
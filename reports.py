@@ -0,0 +1,197 @@
+import csv
+import io
+import os
+from decimal import Decimal
+from importlib.util import find_spec
+from sqlalchemy import select, union_all, literal, func, case, and_
+from services.auth_service.models import User
+from . import models
+
+# School-wide term report: one row per (enrolled student, subject) combining
+# quiz attempts, manual test marks and recorded results.
+#
+# Students are walked in keyset chunks of REPORT_CHUNK_SIZE ids and each chunk
+# is one aggregated query read through a server-side cursor, so memory stays
+# flat however large the school is.
+
+REPORT_CHUNK_SIZE = int(os.getenv("REPORT_CHUNK_SIZE", "1000"))
+
+COLUMNS = [
+    "student_id", "student_name", "subject_code", "subject_name",
+    "quiz_attempts", "quiz_average", "quiz_best",
+    "manual_tests", "manual_average",
+    "results", "result_average",
+    "overall_average",
+]
+
+
+def student_id_chunks(db, school_id: int, chunk_size: int):
+    last_id = 0
+    while True:
+        ids = db.execute(
+            select(User.id)
+            .where(User.school_id == school_id, User.role == "student", User.id > last_id)
+            .order_by(User.id)
+            .limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def report_query(student_ids: list[int], school_id: int):
+    marks = union_all(
+        select(
+            models.QuizAttempt.student_id,
+            models.GeneratedQuiz.subject_id,
+            literal("quiz").label("source"),
+            models.QuizAttempt.score.label("score"),
+        )
+        .join(models.GeneratedQuiz, models.QuizAttempt.quiz_id == models.GeneratedQuiz.id)
+        .where(models.QuizAttempt.student_id.in_(student_ids)),
+        select(
+            models.ManualTestResult.student_id,
+            models.ManualTestResult.subject_id,
+            literal("manual"),
+            models.ManualTestResult.marks,
+        ).where(models.ManualTestResult.student_id.in_(student_ids)),
+        select(
+            models.StudentResult.student_id,
+            models.StudentResult.subject_id,
+            literal("result"),
+            models.StudentResult.marks,
+        ).where(models.StudentResult.student_id.in_(student_ids)),
+    ).subquery()
+
+    def of(source):
+        return case((marks.c.source == source, marks.c.score))
+
+    totals = (
+        select(
+            marks.c.student_id,
+            marks.c.subject_id,
+            func.count(of("quiz")).label("quiz_attempts"),
+            func.avg(of("quiz")).label("quiz_average"),
+            func.max(of("quiz")).label("quiz_best"),
+            func.count(of("manual")).label("manual_tests"),
+            func.avg(of("manual")).label("manual_average"),
+            func.count(of("result")).label("results"),
+            func.avg(of("result")).label("result_average"),
+            func.avg(marks.c.score).label("overall_average"),
+        )
+        .group_by(marks.c.student_id, marks.c.subject_id)
+        .subquery()
+    )
+
+    return (
+        select(
+            User.id,
+            User.fullname,
+            models.Subject.code,
+            models.Subject.name,
+            func.coalesce(totals.c.quiz_attempts, 0),
+            totals.c.quiz_average,
+            totals.c.quiz_best,
+            func.coalesce(totals.c.manual_tests, 0),
+            totals.c.manual_average,
+            func.coalesce(totals.c.results, 0),
+            totals.c.result_average,
+            totals.c.overall_average,
+        )
+        .select_from(models.SubjectEnrollment)
+        .join(User, models.SubjectEnrollment.student_id == User.id)
+        .join(models.Subject, models.SubjectEnrollment.subject_id == models.Subject.id)
+        .outerjoin(totals, and_(
+            totals.c.student_id == models.SubjectEnrollment.student_id,
+            totals.c.subject_id == models.SubjectEnrollment.subject_id,
+        ))
+        .where(models.SubjectEnrollment.student_id.in_(student_ids), models.Subject.school_id == school_id)
+        .order_by(User.id, models.Subject.id)
+    )
+
+
+def report_rows(session_factory, school_id: int, chunk_size: int = REPORT_CHUNK_SIZE):
+    """
+    Yields report rows as tuples in COLUMNS order.
+    Opens its own session because it outlives the request's get_db session.
+    """
+    db = session_factory()
+    try:
+        for student_ids in student_id_chunks(db, school_id, chunk_size):
+            result = db.execute(report_query(student_ids, school_id), execution_options={"yield_per": chunk_size})
+            for row in result:
+                # MariaDB returns AVG() as Decimal
+                yield tuple(round(float(v), 2) if isinstance(v, (float, Decimal)) else v for v in row)
+    finally:
+        db.close()
+
+
+def csv_chunks(rows, chunk_size: int = REPORT_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % chunk_size == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue().encode()
+
+
+def parquet_available() -> bool:
+    return find_spec("pyarrow") is not None
+
+
+class _StreamSink(io.RawIOBase):
+    # Write-only file for ParquetWriter; tell() counts every byte written so
+    # the footer offsets stay right after drained chunks are sent away
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def parquet_chunks(rows, chunk_size: int = REPORT_CHUNK_SIZE):
+    """One row group per chunk. Requires the optional pyarrow package."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("student_id", pa.int64()), ("student_name", pa.string()),
+        ("subject_code", pa.string()), ("subject_name", pa.string()),
+        ("quiz_attempts", pa.int64()), ("quiz_average", pa.float64()), ("quiz_best", pa.float64()),
+        ("manual_tests", pa.int64()), ("manual_average", pa.float64()),
+        ("results", pa.int64()), ("result_average", pa.float64()),
+        ("overall_average", pa.float64()),
+    ])
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema)
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == chunk_size:
+            writer.write_table(pa.Table.from_pylist([dict(zip(COLUMNS, r)) for r in batch], schema=schema))
+            batch = []
+            yield sink.drain()
+    if batch:
+        writer.write_table(pa.Table.from_pylist([dict(zip(COLUMNS, r)) for r in batch], schema=schema))
+    writer.close()
+    yield sink.drain()
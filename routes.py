@@ -1,20 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from services.database import get_db
+from services.database import get_db, SessionLocal
 from services.auth_service.models import User
 from services.auth_service.dependencies import get_current_user
 from . import models, schemas
-from .quiz_generator import generate_quiz
+from .quiz_generator import generate_quiz, generate_quiz_batch
+from .live import hub as live_hub
+from . import question_bank
+from .quiz_parser import stats as generation_stats
+from . import reports
+from . import progress
 from services.sms_service.service import send_sms_to_parents
 import json
 
-router = APIRouter(prefix="/subjects", tags=["Subjects"])
+# ORJSONResponse renders the already-validated response_model output with orjson
+router = APIRouter(prefix="/subjects", tags=["Subjects"], default_response_class=ORJSONResponse)
+
+# Load the question bank index when the app starts and snapshot it on shutdown
+router.add_event_handler("startup", question_bank.warm)
+router.add_event_handler("shutdown", question_bank.persist)
 
 # =====================================================
 # SUBJECTS & ENROLLMENT (PRESERVED & FIXED)
 # =====================================================
 
-@router.get("/enrolled")
+@router.get("/enrolled", response_model=list[schemas.StudentSubjectResponse])
 def get_enrolled_subjects(
     current_user=Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -42,7 +54,7 @@ def get_enrolled_subjects(
         for s in subjects
     ]
 
-@router.get("/")
+@router.get("/", response_model=list[schemas.SubjectListItem])
 def get_all_subjects(current_user=Depends(get_current_user), db: Session = Depends(get_db)):
     # FIXED: Strict school-level filter for all roles
     query = db.query(models.Subject).filter(models.Subject.school_id == current_user.school_id)
@@ -55,7 +67,7 @@ def get_all_subjects(current_user=Depends(get_current_user), db: Session = Depen
     instructor_subs = [s for s in subjects if s.instructor_id == current_user.id]
     return [{"id": s.id, "name": s.name, "code": s.code, "enrollment_key": s.enrollment_key} for s in instructor_subs]
 
-@router.post("/create")
+@router.post("/create", response_model=schemas.SubjectCreatedResponse)
 def create_subject(
     data: schemas.SubjectCreate,
     current_user=Depends(get_current_user),
@@ -77,7 +89,7 @@ def create_subject(
     db.refresh(subject)
     return {"message": "Subject created", "subject_id": subject.id}
 
-@router.post("/{subject_id}/enroll")
+@router.post("/{subject_id}/enroll", response_model=schemas.MessageResponse)
 def enroll_subject(
     subject_id: int,
     key: schemas.EnrollKey,
@@ -116,7 +128,7 @@ def enroll_subject(
 # MATERIALS (PRESERVED & FIXED)
 # =====================================================
 
-@router.post("/{subject_id}/materials/upload")
+@router.post("/{subject_id}/materials/upload", response_model=schemas.MessageResponse)
 def upload_material(
     subject_id: int,
     file: UploadFile = File(...),
@@ -154,7 +166,7 @@ def upload_material(
 # AI-ONLY QUIZZES (PRESERVED & FIXED)
 # =====================================================
 
-@router.post("/{subject_id}/quizzes/generate")
+@router.post("/{subject_id}/quizzes/generate", response_model=schemas.QuizGeneratedResponse)
 def ai_generate_quiz(
     subject_id: int, 
     data: schemas.QuizGenerateRequest, 
@@ -179,15 +191,87 @@ def ai_generate_quiz(
     db.commit()
     db.refresh(new_quiz)
 
-    generate_quiz(new_quiz.id, data.topic, db) 
+    generate_quiz(
+        new_quiz.id,
+        data.topic,
+        db,
+        school_id=current_user.school_id,
+        num_questions=data.number_of_questions,
+        reuse_existing=data.reuse_existing
+    )
 
     return {"message": "Quiz generated successfully", "quiz_id": new_quiz.id}
 
-@router.get("/{subject_id}/quizzes")
+@router.post("/{subject_id}/quizzes/generate-batch", response_model=schemas.QuizBatchGeneratedResponse)
+async def ai_generate_quiz_batch(
+    subject_id: int,
+    data: schemas.QuizBatchGenerateRequest,
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "instructor":
+        raise HTTPException(403, "Only instructors can generate quizzes")
+
+    def create_quizzes():
+        subject = db.query(models.Subject).filter_by(id=subject_id, school_id=current_user.school_id).first()
+        if not subject:
+            return None
+
+        quizzes = [
+            models.GeneratedQuiz(
+                subject_id=subject_id,
+                title=q.title,
+                topic=q.topic,
+                created_by=current_user.id
+            )
+            for q in data.quizzes
+        ]
+        db.add_all(quizzes)
+        db.commit()
+        return [quiz.id for quiz in quizzes]
+
+    quiz_ids = await run_in_threadpool(create_quizzes)
+    if quiz_ids is None:
+        raise HTTPException(404, "Subject not found")
+
+    # All topics are generated concurrently and saved in one bulk insert
+    saved = await generate_quiz_batch(
+        [
+            (quiz_id, q.topic, q.number_of_questions, data.reuse_existing and q.reuse_existing)
+            for quiz_id, q in zip(quiz_ids, data.quizzes)
+        ],
+        db,
+        school_id=current_user.school_id,
+        concurrency=data.concurrency
+    )
+
+    return {
+        "message": f"Generated {sum(saved.values())} questions across {len(quiz_ids)} quizzes",
+        "quizzes": [
+            {
+                "quiz_id": quiz_id,
+                "title": q.title,
+                "topic": q.topic,
+                "questions_requested": q.number_of_questions,
+                "questions_generated": saved[quiz_id]
+            }
+            for quiz_id, q in zip(quiz_ids, data.quizzes)
+        ]
+    }
+
+@router.get("/quizzes/generation-stats", response_model=schemas.QuizGenerationStats)
+def get_generation_stats(current_user=Depends(get_current_user)):
+    if current_user.role not in ("instructor", "admin"):
+        raise HTTPException(403, "Only instructors can view generation stats")
+
+    # Counters are kept per worker process
+    return generation_stats.snapshot()
+
+@router.get("/{subject_id}/quizzes", response_model=list[schemas.GeneratedQuizResponse])
 def get_subject_quizzes(subject_id: int, db: Session = Depends(get_db)):
     return db.query(models.GeneratedQuiz).filter_by(subject_id=subject_id).all()
 
-@router.get("/quizzes/{quiz_id}/questions")
+@router.get("/quizzes/{quiz_id}/questions", response_model=list[schemas.QuizQuestionResponse])
 def get_quiz_questions(quiz_id: int, db: Session = Depends(get_db)):
     questions = db.query(models.GeneratedQuestion).filter_by(quiz_id=quiz_id).all()
     return [
@@ -199,8 +283,12 @@ def get_quiz_questions(quiz_id: int, db: Session = Depends(get_db)):
         for q in questions
     ]
 
-@router.post("/quizzes/{quiz_id}/submit")
+@router.post("/quizzes/{quiz_id}/submit", response_model=schemas.QuizSubmissionResult)
 def submit_quiz(quiz_id: int, submission: dict, current_user=Depends(get_current_user), db: Session = Depends(get_db)):
+    quiz = db.query(models.GeneratedQuiz).filter_by(id=quiz_id).first()
+    if not quiz:
+        raise HTTPException(404, "Quiz not found")
+
     user_answers = submission.get("answers", {})
     questions = db.query(models.GeneratedQuestion).filter_by(quiz_id=quiz_id).all()
     
@@ -228,11 +316,18 @@ def submit_quiz(quiz_id: int, submission: dict, current_user=Depends(get_current
         answers_json=json.dumps(user_answers)
     )
     db.add(attempt)
+    # Summary row is updated in the same transaction as the attempt;
+    # quizzes without a subject have no progress row to update
+    if quiz.subject_id is not None:
+        progress.record_score(db, current_user.id, quiz.subject_id, round(score, 2))
     db.commit()
 
+    # Push the new score to anyone watching this quiz live
+    live_hub.publish_score(quiz_id, current_user.id, current_user.fullname, round(score, 2))
+
     return {"score": round(score, 2), "feedback": feedback}
 
-@router.get("/my-results")
+@router.get("/my-results", response_model=list[schemas.StudentAttemptResponse])
 def get_my_results(
     current_user=Depends(get_current_user), 
     db: Session = Depends(get_db)
@@ -259,7 +354,54 @@ def get_my_results(
         for r in results
     ]
 
-@router.get("/quizzes/{quiz_id}/analytics")
+@router.get("/my-progress", response_model=list[schemas.StudentProgressResponse])
+def get_my_progress(
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "student":
+        raise HTTPException(403, "Only students can view their progress")
+
+    return [
+        {
+            "subject_id": p.subject_id,
+            "subject_name": subject_name,
+            "attempt_count": p.attempt_count,
+            "average_score": p.average_score,
+            "best_score": p.best_score,
+            "latest_score": p.latest_score,
+            "last_activity": p.last_activity
+        }
+        for p, subject_name in progress.student_progress(db, current_user.id)
+    ]
+
+@router.get("/{subject_id}/progress", response_model=list[schemas.SubjectProgressEntry])
+def get_subject_progress(
+    subject_id: int,
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role != "instructor":
+        raise HTTPException(403, "Only instructors can view subject progress")
+
+    subject = db.query(models.Subject).filter_by(id=subject_id, school_id=current_user.school_id).first()
+    if not subject:
+        raise HTTPException(404, "Subject not found")
+
+    return [
+        {
+            "student_id": p.student_id,
+            "student_name": fullname if fullname else "Unknown Student",
+            "attempt_count": p.attempt_count,
+            "average_score": p.average_score,
+            "best_score": p.best_score,
+            "latest_score": p.latest_score,
+            "last_activity": p.last_activity
+        }
+        for p, fullname in progress.subject_progress(db, subject_id)
+    ]
+
+@router.get("/quizzes/{quiz_id}/analytics", response_model=list[schemas.QuizAnalyticsEntry])
 def get_quiz_analytics(
     quiz_id: int, 
     current_user=Depends(get_current_user), 
@@ -300,7 +442,7 @@ def get_quiz_analytics(
 # MANUAL MARKING & STUDENT LIST (FIXED)
 # =====================================================
 
-@router.get("/{subject_id}/students")
+@router.get("/{subject_id}/students", response_model=list[schemas.SubjectStudentResponse])
 def get_subject_students(
     subject_id: int, 
     db: Session = Depends(get_db), 
@@ -323,7 +465,7 @@ def get_subject_students(
     
     return [{"id": s.id, "fullname": s.fullname} for s in students]
 
-@router.post("/manual-mark")
+@router.post("/manual-mark", response_model=schemas.StatusResponse)
 def record_manual_mark(
     data: schemas.ManualMarkRequest, 
     db: Session = Depends(get_db),
@@ -346,6 +488,7 @@ def record_manual_mark(
         marks=data.marks
     )
     db.add(new_result)
+    progress.record_score(db, data.student_id, data.subject_id, data.marks)
     db.commit()
     db.refresh(new_result)
 
@@ -356,4 +499,38 @@ def record_manual_mark(
         except Exception as e:
             print(f"SMS Failed: {e}")
 
-    return {"status": "success", "message": "Result recorded and SMS sent"}
\ No newline at end of file
+    return {"status": "success", "message": "Result recorded and SMS sent"}
+
+# =====================================================
+# SCHOOL REPORTS
+# =====================================================
+
+@router.get("/reports/export", response_class=StreamingResponse)
+def export_school_report(
+    format: str = "csv",
+    current_user = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only school admins can export reports")
+
+    # Rows are streamed chunk by chunk, so memory does not grow with school size
+    rows = reports.report_rows(SessionLocal, current_user.school_id)
+    filename = f"school_{current_user.school_id}_report"
+
+    if format == "csv":
+        return StreamingResponse(
+            reports.csv_chunks(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'}
+        )
+
+    if format == "parquet":
+        if not reports.parquet_available():
+            raise HTTPException(400, "Parquet export is not available on this server")
+        return StreamingResponse(
+            reports.parquet_chunks(rows),
+            media_type="application/vnd.apache.parquet",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.parquet"'}
+        )
+
+    raise HTTPException(400, "format must be csv or parquet")
\ No newline at end of file
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, StringConstraints, field_validator, model_validator
+from typing import Annotated, Optional, Union
+from datetime import datetime
+import re
 
 class SubjectCreate(BaseModel):
     name: str
@@ -32,16 +34,185 @@ class ResultCreate(BaseModel):
     result_type: str = "quiz"
     model_config = {"from_attributes": True}
 
+# Generation is bounded so one request cannot spend a school's daily AI budget
+MAX_QUESTIONS_PER_QUIZ = 50
+MAX_QUIZZES_PER_BATCH = 20
+
 class QuizGenerateRequest(BaseModel):
     title: str
     topic: str
-    number_of_questions: int = 5
+    number_of_questions: int = Field(5, ge=1, le=MAX_QUESTIONS_PER_QUIZ)
+    # Fill from matching questions already in the school's bank before calling the LLM
+    reuse_existing: bool = True
+    model_config = {"from_attributes": True}
+
+class QuizBatchGenerateRequest(BaseModel):
+    quizzes: list[QuizGenerateRequest] = Field(min_length=1, max_length=MAX_QUIZZES_PER_BATCH)
+    # Optional lower cap on parallel LLM calls (server limit still applies)
+    concurrency: Optional[int] = None
+    # False turns reuse off for the whole batch; each quiz can also opt out on its own
+    reuse_existing: bool = True
     model_config = {"from_attributes": True}
 
+# --- ONE QUESTION AS RETURNED BY THE LLM ---
+# Option columns are VARCHAR(255), so longer options are rejected here rather than at insert
+ANSWER_PREFIX = re.compile(r"^answer\s*[:\-]?\s*", re.IGNORECASE)
+# "b", "B)", "(B)", "B.", "B: Mitochondria"; a bare word like "Bacteria" is not a letter
+ANSWER_LETTER = re.compile(r"^\(?([A-D])\s*(?:[).:]|$)", re.IGNORECASE)
+
+OptionText = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=255)]
+
+class GeneratedQuestionOptions(BaseModel):
+    A: OptionText
+    B: OptionText
+    C: OptionText
+    D: OptionText
+
+class GeneratedQuestionPayload(BaseModel):
+    question: Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+    options: GeneratedQuestionOptions
+    answer: str
+
+    @field_validator("options", mode="before")
+    @classmethod
+    def options_from_list(cls, v):
+        # Some responses give the options as a plain list of four strings
+        if isinstance(v, list) and len(v) == 4:
+            return dict(zip("ABCD", v))
+        return v
+
+    @model_validator(mode="after")
+    def answer_letter(self):
+        # A letter in any common form, or the text of one of the options
+        answer = ANSWER_PREFIX.sub("", self.answer.strip())
+        match = ANSWER_LETTER.match(answer)
+        if match:
+            self.answer = match.group(1).upper()
+            return self
+        for letter, text in self.options.model_dump().items():
+            if answer.casefold() == text.casefold():
+                self.answer = letter
+                return self
+        raise ValueError("answer must be one of A, B, C, D or the text of an option")
+
 # --- NEW SCHEMA FOR MANUAL MARK ENTRY ---
 class ManualMarkRequest(BaseModel):
     student_id: int
     subject_id: int
     test_title: str
     marks: float  # Using float to allow for decimal marks if needed
-    model_config = {"from_attributes": True}
\ No newline at end of file
+    model_config = {"from_attributes": True}
+
+# =====================================================
+# RESPONSE MODELS
+# =====================================================
+# Every subjects route declares one of these as its response_model so the
+# payload is validated and dumped by pydantic-core instead of FastAPI's
+# generic jsonable_encoder walking SQLAlchemy instance state.
+
+class MessageResponse(BaseModel):
+    message: str
+
+class StatusResponse(BaseModel):
+    status: str
+    message: str
+
+class StudentSubjectResponse(BaseModel):
+    id: int
+    name: Optional[str] = None
+    code: Optional[str] = None
+    instructor_id: Optional[int]
+    model_config = {"from_attributes": True}
+
+class InstructorSubjectResponse(BaseModel):
+    id: int
+    name: Optional[str] = None
+    code: Optional[str] = None
+    enrollment_key: Optional[str]
+    model_config = {"from_attributes": True}
+
+# Students and instructors get differently shaped subject lists from GET /subjects/
+SubjectListItem = Union[StudentSubjectResponse, InstructorSubjectResponse]
+
+class SubjectCreatedResponse(BaseModel):
+    message: str
+    subject_id: int
+
+class QuizGeneratedResponse(BaseModel):
+    message: str
+    quiz_id: int
+
+class QuizBatchItemResult(BaseModel):
+    quiz_id: int
+    title: str
+    topic: str
+    questions_requested: int
+    questions_generated: int
+
+class QuizBatchGeneratedResponse(BaseModel):
+    message: str
+    quizzes: list[QuizBatchItemResult]
+
+class GeneratedQuizResponse(BaseModel):
+    id: int
+    subject_id: Optional[int] = None
+    title: str
+    topic: str
+    created_by: Optional[int] = None
+    created_at: Optional[datetime] = None
+    model_config = {"from_attributes": True}
+
+class QuizQuestionResponse(BaseModel):
+    id: int
+    text: str
+    options: list[Optional[str]]
+
+class QuizSubmissionResult(BaseModel):
+    score: float
+    feedback: str
+
+class StudentAttemptResponse(BaseModel):
+    id: int
+    quiz_title: str
+    score: Optional[float] = None
+    feedback: Optional[str] = None
+    date: int
+
+class QuizAnalyticsEntry(BaseModel):
+    student_name: str
+    score: Optional[float] = None
+    feedback: Optional[str] = None
+    submitted_at: str
+
+class StudentProgressResponse(BaseModel):
+    subject_id: int
+    subject_name: Optional[str] = None
+    attempt_count: int
+    average_score: Optional[float] = None
+    best_score: Optional[float] = None
+    latest_score: Optional[float] = None
+    last_activity: Optional[datetime] = None
+
+class SubjectProgressEntry(BaseModel):
+    student_id: int
+    student_name: str
+    attempt_count: int
+    average_score: Optional[float] = None
+    best_score: Optional[float] = None
+    latest_score: Optional[float] = None
+    last_activity: Optional[datetime] = None
+
+class QuizGenerationStats(BaseModel):
+    responses: int
+    questions_requested: int
+    questions_parsed: int
+    broken_responses: int
+    questions_salvaged: int
+    objects_rejected: int
+    rerequests: int
+    salvage_rate: float
+
+class SubjectStudentResponse(BaseModel):
+    id: int
+    fullname: Optional[str] = None
+    model_config = {"from_attributes": True}
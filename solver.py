@@ -1,34 +1,55 @@
 import os
-from google import genai
-from google.genai import types
+from functools import lru_cache
+from services.llm_quota import get_quota, QuotaExceeded
 
 # Ensure this matches the variable in your .env
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY") 
 
-def solve_question(prompt: str, language: str = "en") -> str:
+@lru_cache(maxsize=1)
+def _get_client():
+    # google.genai is slow to import, so it is loaded on the first question
+    # rather than when the chatbot router is registered
+    from google import genai
+    return genai.Client(api_key=GEMINI_API_KEY)
+
+# The chatbot route must pass current_user.school_id. Without it a question is
+# charged only to the model and chat budgets, not to the school's daily budget,
+# so one school could spend the chat budget every other school shares.
+def solve_question(prompt: str, language: str = "en", school_id: int | None = None) -> str:
     if not GEMINI_API_KEY:
         return "AI API key not set."
 
     try:
-        # 1. Initialize the modern Client
-        client = genai.Client(api_key=GEMINI_API_KEY)
+        from google.genai import types
+
+        # 1. Reuse the modern Client (created on first use)
+        client = _get_client()
 
         # 2. Use the same model as your quizzes (Gemma 3)
         # It has a high free quota (14,400+ requests/day)
         model_id = "models/gemma-3-27b-it" 
 
         # 3. Generate content with an 'Educational Assistant' persona
-        response = client.models.generate_content(
-            model=model_id,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                system_instruction=f"You are a helpful educational assistant. Please answer in {language}.",
-                temperature=0.7
-            )
+        #    Queued behind quiz generation, which shares the same quota
+        response = get_quota().call(
+            "chat",
+            lambda: client.models.generate_content(
+                model=model_id,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    system_instruction=f"You are a helpful educational assistant. Please answer in {language}.",
+                    temperature=0.7
+                )
+            ),
+            school_id=school_id
         )
 
         return response.text
 
+    except QuotaExceeded as e:
+        print(f"DEBUG: AI quota: {e} (retry after {e.retry_after:.0f}s)")
+        return "The AI assistant is busy right now. Please try again in a few minutes."
+
     except Exception as e:
         print(f"DEBUG: AI Service Error: {e}")
         return "Sorry, I'm having trouble connecting to my brain right now."
\ No newline at end of file
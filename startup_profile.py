@@ -0,0 +1,86 @@
+"""
+Reports per-module import cost of the API so worker boot time can be tracked.
+
+Runs `import main` in a fresh interpreter with `-X importtime` and summarises
+the result. Exits with status 1 when the total exceeds --budget-ms, so it can
+be used as a CI gate.
+
+Usage:
+    python startup_profile.py --top 20 --budget-ms 1500
+    python startup_profile.py --lazy    # profile with EDUSA_LAZY_ROUTERS=1
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+
+def profile_imports(target: str, lazy: bool):
+    env = dict(os.environ)
+    if lazy:
+        env["EDUSA_LAZY_ROUTERS"] = "1"
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode != 0:
+        # importtime lines are interleaved with the traceback on stderr
+        errors = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+        raise SystemExit(f"import {target} failed:\n" + "\n".join(errors))
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        # import time:       self [us] |     cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def group_name(module: str) -> str:
+    # services.channels_service.comments.routes -> services.channels_service
+    parts = module.split(".")
+    return ".".join(parts[:2]) if parts[0] == "services" else parts[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile API import time per module")
+    parser.add_argument("--target", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--lazy", action="store_true", help="profile with lazy router loading enabled")
+    args = parser.parse_args()
+
+    rows = profile_imports(args.target, args.lazy)
+    total_us = next((c for name, _, c in rows if name == args.target), sum(s for _, s, _ in rows))
+
+    by_group = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_group[group_name(name)] += self_us
+
+    print(f"import {args.target}: {total_us / 1000:.1f} ms total ({len(rows)} modules)"
+          + (" [lazy routers]" if args.lazy else ""))
+
+    print(f"\nTop {args.top} packages by self time:")
+    for group, self_us in sorted(by_group.items(), key=lambda g: g[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {group}")
+
+    print(f"\nTop {args.top} modules by cumulative time:")
+    for name, _, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if args.budget_ms is not None:
+        if total_us / 1000 > args.budget_ms:
+            print(f"\nOVER BUDGET: {total_us / 1000:.1f} ms > {args.budget_ms:.1f} ms")
+            sys.exit(1)
+        print(f"\nWithin budget ({args.budget_ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
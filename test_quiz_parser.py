@@ -0,0 +1,121 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from services.subjects_service.quiz_parser import QuestionStreamParser, parse_questions, strict_parse_ok
+from services.subjects_service.schemas import GeneratedQuestionPayload
+
+OPTIONS = {"A": "Nucleus", "B": "Mitochondria", "C": "Bacteria", "D": "Ribosome"}
+
+
+def question(n: int, answer: str = "B") -> dict:
+    return {"question": f"Question {n}?", "options": OPTIONS, "answer": answer}
+
+
+def as_json(n: int) -> str:
+    return json.dumps(question(n))
+
+
+def texts(found: list[dict]) -> list[str]:
+    return [q["question"] for q in found]
+
+
+def feed_in_chunks(text: str, size: int) -> list[dict]:
+    parser = QuestionStreamParser()
+    found = []
+    for i in range(0, len(text), size):
+        found += parser.feed(text[i:i + size])
+    return found
+
+
+CASES = {
+    "plain array": (f"[{as_json(1)}, {as_json(2)}]", ["Question 1?", "Question 2?"]),
+    "markdown fence and prose": (
+        f"Here is your quiz:\n```json\n[{as_json(1)},\n{as_json(2)}]\n```\nGood luck!",
+        ["Question 1?", "Question 2?"],
+    ),
+    "trailing commas": (
+        '[{"question": "Question 1?", "options": {"A": "a", "B": "b", "C": "c", "D": "d",}, "answer": "A",},]',
+        ["Question 1?"],
+    ),
+    "curly quotes": (
+        "[{“question”: “Question 1?”, “options”: {“A”: “a”, “B”: “b”, “C”: “c”, “D”: “d”}, “answer”: “C”}]",
+        ["Question 1?"],
+    ),
+    "wrapper object": (f'{{"questions": [{as_json(1)}, {as_json(2)}]}}', ["Question 1?", "Question 2?"]),
+    "nested wrapper": (
+        f'{{"quiz": {{"title": "Cells", "items": [{as_json(1)}]}}}}',
+        ["Question 1?"],
+    ),
+    "unclosed object": (f"[{as_json(1)[:-1]}, {as_json(2)}, {as_json(3)}]", ["Question 2?", "Question 3?"]),
+    "truncated output": (f"[{as_json(1)}, {as_json(2)[:40]}", ["Question 1?"]),
+    "broken object in the middle": (
+        f'[{as_json(1)}, {{"question": "Bad?", "options": {{"A": }}}}, {as_json(3)}]',
+        ["Question 1?", "Question 3?"],
+    ),
+    "invalid answer": (f'[{json.dumps(question(1, answer="E"))}, {as_json(2)}]', ["Question 2?"]),
+}
+
+
+@pytest.mark.parametrize("text, expected", CASES.values(), ids=CASES.keys())
+def test_parse_questions_salvages_valid_objects(text, expected):
+    found, _ = parse_questions(text)
+    assert texts(found) == expected
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64])
+@pytest.mark.parametrize("text, expected", CASES.values(), ids=CASES.keys())
+def test_chunked_feed_matches_whole_text(text, expected, size):
+    assert texts(feed_in_chunks(text, size)) == expected
+
+
+def test_counts_rejected_objects():
+    _, parser = parse_questions(f"[{as_json(1)[:-1]}, {as_json(2)}, {{\"question\": 1}}]")
+    # The unclosed first question and the invalid last one
+    assert (parser.objects, parser.valid) == (3, 1)
+
+
+def test_wrapper_is_not_counted_as_rejected():
+    _, parser = parse_questions(f'{{"questions": [{as_json(1)}, {as_json(2)}]}}')
+    assert (parser.objects, parser.valid) == (2, 2)
+
+
+def test_options_object_does_not_restart_the_scan():
+    found, parser = parse_questions(as_json(1))
+    assert found == [{"question": "Question 1?", "options": OPTIONS, "answer": "B"}]
+    assert parser.objects == 1
+
+
+def test_strict_parse_ok():
+    assert strict_parse_ok(f"```json\n[{as_json(1)}]\n```")
+    assert not strict_parse_ok(f"[{as_json(1)}, {as_json(2)[:40]}")
+
+
+@pytest.mark.parametrize("answer, letter", [
+    ("B", "B"),
+    ("b", "B"),
+    ("B)", "B"),
+    ("(B)", "B"),
+    ("B.", "B"),
+    ("B: Mitochondria", "B"),
+    ("B. Mitochondria", "B"),
+    ("Answer: B", "B"),
+    ("answer - c", "C"),
+    ("mitochondria", "B"),
+    ("Bacteria", "C"),
+    ("  Ribosome ", "D"),
+])
+def test_answer_letter_accepts(answer, letter):
+    assert GeneratedQuestionPayload(question="Q?", options=OPTIONS, answer=answer).answer == letter
+
+
+@pytest.mark.parametrize("answer", ["E", "Because B", "Cell", "", "AB"])
+def test_answer_letter_rejects(answer):
+    with pytest.raises(ValidationError):
+        GeneratedQuestionPayload(question="Q?", options=OPTIONS, answer=answer)
+
+
+def test_options_may_be_a_list():
+    payload = GeneratedQuestionPayload(question="Q?", options=list(OPTIONS.values()), answer="D")
+    assert payload.options.model_dump() == OPTIONS